@@ -0,0 +1,74 @@
+import os
+import time
+from dotenv import load_dotenv
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+
+load_dotenv()
+
+# Connect to Redis if one is configured; without it only the in-process cache is used
+REDIS_URL = os.getenv("REDIS_URL")
+redis_client = aioredis.from_url(REDIS_URL) if REDIS_URL else None
+
+# How long cached product data stays fresh, in seconds
+PRODUCTS_TTL = 60
+
+PRODUCTS_ALL_KEY = "products:all"
+
+# In-process cache in front of Redis: {product ID or PRODUCTS_ALL_KEY: (expires_at, value)}
+local_cache = {}
+
+
+def product_key(product_id):
+    return f"products:{product_id}"
+
+
+async def cache_get(key):
+    """Read a raw value from Redis, treating an outage as a cache miss."""
+    if redis_client is None:
+        return None
+    try:
+        return await redis_client.get(key)
+    except RedisError:
+        return None
+
+
+async def cache_set(key, value, ttl=PRODUCTS_TTL):
+    """Store a raw value in Redis; failures are ignored so Mongo stays the source of truth."""
+    if redis_client is None:
+        return
+    try:
+        await redis_client.set(key, value, ex=ttl)
+    except RedisError:
+        pass
+
+
+def local_get(key):
+    entry = local_cache.get(key)
+    if entry is None or entry[0] < time.monotonic():
+        return None
+    return entry[1]
+
+
+def local_set(key, value, ttl=PRODUCTS_TTL):
+    local_cache[key] = (time.monotonic() + ttl, value)
+
+
+async def invalidate_products(product_id=None):
+    """Drop cached product data after a product write; no ID means every product."""
+    if product_id is None:
+        local_cache.clear()
+    else:
+        local_cache.pop(product_id, None)
+        local_cache.pop(PRODUCTS_ALL_KEY, None)
+    if redis_client is None:
+        return
+    try:
+        if product_id is None:
+            keys = [key async for key in redis_client.scan_iter("products:*")]
+        else:
+            keys = [PRODUCTS_ALL_KEY, product_key(product_id)]
+        if keys:
+            await redis_client.delete(*keys)
+    except RedisError:
+        pass
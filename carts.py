@@ -0,0 +1,61 @@
+import uuid
+from typing import Dict, Optional
+from redis.exceptions import RedisError
+from cache import redis_client
+from checkout_core import parse_cart
+
+# Carts live in Redis hashes (cart:{user_id} -> {product_id: quantity}) so every
+# worker sees the same cart. Without Redis they fall back to this dict, which is
+# only correct when running a single worker.
+local_carts: Dict[int, Dict[int, int]] = {}
+
+
+# How long the marker proving a cart write landed is kept, in seconds
+WRITE_MARKER_TTL = 300
+
+
+class CartWriteError(Exception):
+    """A cart write failed. applied is False when it certainly did not land, None when unknown."""
+
+    def __init__(self, applied: Optional[bool]):
+        super().__init__("Cart write failed")
+        self.applied = applied
+
+
+def cart_key(user_id):
+    return f"cart:{user_id}"
+
+
+async def add_item(user_id: int, product_id: int, quantity: int):
+    """Add quantity of a product to a user's cart, merging with what is there.
+
+    Raises CartWriteError if the item did not make it into the cart, or if that
+    can't be told.
+    """
+    if redis_client is None:
+        cart = local_carts.setdefault(user_id, {})
+        cart[product_id] = cart.get(product_id, 0) + quantity
+        return
+
+    # MULTI/EXEC applies the increment and the marker together or not at all, so
+    # if the reply is lost (e.g. a timeout) the marker tells us whether it landed
+    marker = f"cartwrite:{uuid.uuid4().hex}"
+    try:
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.hincrby(cart_key(user_id), product_id, quantity)
+            pipe.set(marker, 1, ex=WRITE_MARKER_TTL)
+            await pipe.execute()
+    except RedisError as e:
+        try:
+            applied = bool(await redis_client.exists(marker))
+        except RedisError:
+            raise CartWriteError(None) from e
+        if not applied:
+            raise CartWriteError(False) from e
+
+
+async def get_cart(user_id: int) -> Dict[int, int]:
+    """Return a user's cart as product ID -> quantity; empty if there is none."""
+    if redis_client is None:
+        return dict(local_carts.get(user_id, {}))
+    return parse_cart(await redis_client.hgetall(cart_key(user_id)))
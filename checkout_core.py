@@ -0,0 +1,29 @@
+from typing import Dict, List, Mapping
+
+# Small per-request cart helpers. They only use builtins and are fully annotated
+# so mypyc can compile this module (see README); the plain .py works unchanged.
+
+
+def parse_cart(raw: Dict[bytes, bytes]) -> Dict[int, int]:
+    """Decode a Redis cart hash into product ID -> quantity."""
+    cart: Dict[int, int] = {}
+    for product_id, quantity in raw.items():
+        cart[int(product_id)] = int(quantity)
+    return cart
+
+
+def missing_products(index: Mapping[int, int], cart: Dict[int, int]) -> List[int]:
+    """Return the product IDs in the cart that are not in the index."""
+    missing: List[int] = []
+    for product_id in cart:
+        if product_id not in index:
+            missing.append(product_id)
+    return missing
+
+
+def compute_total(prices: Mapping[int, float], cart: Dict[int, int]) -> float:
+    """Total price of a product_id -> quantity cart."""
+    total = 0.0
+    for product_id, quantity in cart.items():
+        total += prices[product_id] * quantity
+    return total
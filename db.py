@@ -1,18 +1,111 @@
-from pymongo import MongoClient
+from functools import lru_cache
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import OperationFailure
 import os
 from dotenv import load_dotenv
 from product_list import products
 
 load_dotenv()
 
+
+@lru_cache(maxsize=None)
+def get_mongo_client():
+    """Create the Mongo client once and reuse its connection pool."""
+    return AsyncIOMotorClient(
+        os.getenv("MONGO_URL"),
+        maxPoolSize=int(os.getenv("MONGO_MAX_POOL_SIZE", "200")),
+        minPoolSize=int(os.getenv("MONGO_MIN_POOL_SIZE", "20")),
+        compressors="zstd,zlib",
+        serverSelectionTimeoutMS=2000,
+        retryReads=True,
+    )
+
+
 # Connect to Mongo Atlas Cluster
-mongo_client = MongoClient(os.getenv("MONGO_URL"))
+mongo_client = get_mongo_client()
 
 # Access database
 ecommerce_db = mongo_client["ecommerce_db"]
 
 # Pick a collection to operate om
 ecommerce_collection = ecommerce_db["products"]
+users_collection = ecommerce_db["users"]
+counters_collection = ecommerce_db["counters"]
+
+
+async def migrate_legacy_products():
+    """Bring products stored by older versions into the current shape.
+
+    Before integer _ids, products were inserted with Mongo's default ObjectId _id
+    plus a separate "id" field, and without a "stock" field. Those documents are
+    moved to their integer ID and given a stock level. Safe to run on every start
+    and from several workers at once.
+    """
+    # Earlier revisions indexed "id" uniquely (new documents have no "id", so it has
+    # to go) and "name" (never queried, it only slowed down stock updates)
+    for index_name in ("id_1", "name_1"):
+        try:
+            await ecommerce_collection.drop_index(index_name)
+        except OperationFailure:
+            pass  # Already gone, or never created
+
+    legacy = await ecommerce_collection.find({"_id": {"$type": "objectId"}}).to_list(length=None)
+    if legacy:
+        operations = [
+            UpdateOne(
+                {"_id": doc["id"]},
+                {"$setOnInsert": {k: v for k, v in doc.items() if k not in ("_id", "id")}},
+                upsert=True
+            )
+            for doc in legacy if "id" in doc
+        ]
+        if operations:
+            await ecommerce_collection.bulk_write(operations, ordered=False)
+        # Documents without an "id" can't be addressed by the API, so they go too
+        await ecommerce_collection.delete_many({"_id": {"$in": [doc["_id"] for doc in legacy]}})
+
+    # Give stockless catalog products their sample stock, and anything else none
+    await ecommerce_collection.bulk_write(
+        [
+            UpdateOne({"_id": p["id"], "stock": {"$exists": False}}, {"$set": {"stock": p["stock"]}})
+            for p in products
+        ],
+        ordered=False
+    )
+    await ecommerce_collection.update_many({"stock": {"$exists": False}}, {"$set": {"stock": 0}})
+
+
+async def seed_products():
+    """Insert any missing sample products; existing documents are left untouched.
+
+    Set SEED_DB=0 on workers that should skip seeding entirely.
+    """
+    if os.getenv("SEED_DB", "1") != "1":
+        return
+    operations = [
+        UpdateOne(
+            {"_id": p["id"]},
+            {"$setOnInsert": {k: v for k, v in p.items() if k != "id"}},
+            upsert=True
+        )
+        for p in products
+    ]
+    await ecommerce_collection.bulk_write(operations, ordered=False)
+
+
+async def create_indexes():
+    """Index the user fields looked up on register and login; products only need the built-in _id index."""
+    await users_collection.create_index([("email", 1)], unique=True)
+    await users_collection.create_index([("username", 1)], unique=True)
+
 
-if ecommerce_collection.count_documents({}) == 0:
-    ecommerce_collection.insert_many(products)
\ No newline at end of file
+async def next_sequence(name):
+    """Atomically hand out the next integer ID for the given counter."""
+    counter = await counters_collection.find_one_and_update(
+        {"_id": name},
+        {"$inc": {"seq": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return counter["seq"]
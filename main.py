@@ -1,10 +1,19 @@
-# import uvicorn
-from fastapi import FastAPI, HTTPException, status
-from pydantic import BaseModel, EmailStr, Field
+import asyncio
+import hashlib
+import os
+import sys
+import orjson
+from fastapi import FastAPI, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
+from pydantic import AliasChoices, BaseModel, ConfigDict, EmailStr, Field
 from typing import Dict, List
-from product_list import products
-from db import ecommerce_collection
-from bson.objectid import ObjectId
+from pymongo.errors import DuplicateKeyError
+from db import ecommerce_collection, users_collection, migrate_legacy_products, seed_products, create_indexes, next_sequence
+from cache import REDIS_URL, PRODUCTS_ALL_KEY, PRODUCTS_TTL, product_key, cache_get, cache_set, local_get, local_set, invalidate_products
+from utils import hash_password, verify_password
+import carts
+import pricing
 
 
 
@@ -12,26 +21,24 @@ from bson.objectid import ObjectId
 # Initialize the FastAPI app
 app = FastAPI(
     title="Simple E-commerce Backend API",
-    description="A basic backend for an e-commerce platform with product and order management."
+    description="A basic backend for an e-commerce platform with product and order management.",
+    default_response_class=ORJSONResponse
 )
 
-# --- In-memory data storage (simulating a database) ---
-# Dictionaries to store our data. In a real application, you would use a database.
-# We'll use product IDs, order IDs, and user IDs as keys.
-products_db: Dict[int, 'Product'] = {}
-orders_db: Dict[int, 'Order'] = {}
-carts_db: Dict[int, List['ProductInOrder']] = {}
-users_db: Dict[int, 'User'] = {}
+# --- Data storage ---
+# Products and users live in MongoDB; carts live in Redis (see carts.py).
 
-# Keep track of the next available ID for products, orders, and users
-next_product_id = 1
-next_order_id = 1
-next_user_id = 1
+# Only the fields the Product model needs; the integer _id is the product ID
+PRODUCT_PROJECTION = {"_id": 1, "name": 1, "description": 1, "price": 1, "image": 1, "stock": 1}
 
 # --- Pydantic Models for Data Validation ---
 # These models define the structure and validation rules for our data.
 
-class ProductBase(BaseModel):
+class AppModel(BaseModel):
+    """Base for every model: immutable, and unknown fields are rejected."""
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
+class ProductBase(AppModel):
     """Base model for a product."""
     name: str
     description: str
@@ -41,64 +48,102 @@ class ProductBase(BaseModel):
 
 class Product(ProductBase):
     """Model for a product, including its ID."""
-    id: int
+    # Read straight from Mongo's _id, but serialized as "id"
+    id: int = Field(validation_alias=AliasChoices("_id", "id"))
 
 class ProductCreate(ProductBase):
     """Model for creating a new product."""
     pass
 
-class ProductInOrder(BaseModel):
+class ProductInOrder(AppModel):
     """Model representing a product and its quantity within an order."""
     product_id: int
     quantity: int
 
-class Order(BaseModel):
+class Order(AppModel):
     """Model for a complete order."""
     id: int
     products: List[ProductInOrder]
     total_price: float
     status: str = "pending"
 
-class AddToCartRequest(BaseModel):
+class AddToCartRequest(AppModel):
     """Model for the request body when adding to cart."""
     user_id: int
     product_id: int
-    quantity: int
+    quantity: int = Field(gt=0)
 
 # Pydantic models for user management
-class UserCreate(BaseModel):
+class UserCreate(AppModel):
     """Model for creating a new user."""
     username: str
     email: str
     password: str
 
-class UserLogin(BaseModel):
+class UserLogin(AppModel):
     """Model for user login."""
     email: str
     password: str
 
-class User(BaseModel):
+class User(AppModel):
     """Model for a user, including the ID."""
     id: int
     username: str
     email: str
 
 # Model for the checkout summary response
-class CheckoutSummary(BaseModel):
+class CheckoutSummary(AppModel):
     """Model representing the summary of a checkout."""
     cart_items: List[ProductInOrder]
     total_price: float
 
-# --- Populate with sample data ---
-# This simulates having some initial data in a database.
-products_db[1] = Product(id=1, name="Smartphone", description="A great phone with a fantastic camera.", price=699.99, image="https://example.com/smartphone.jpg", stock=15)
-products_db[2] = Product(id=2, name="Laptop", description="Powerful laptop for work and gaming.", price=1200.00, image="https://example.com/laptop.jpg", stock=8)
-products_db[3] = Product(id=3, name="Wireless Headphones", description="Noise-cancelling headphones with long battery life.", price=199.50, image="https://example.com/headphones.jpg", stock=30)
-products_db[4] = Product(id=4, name= "bag", description= "Louis Vuitton - black", price= 500.00, image= "https://example.com/bag.jpg", stock=5)
-products_db[5] = Product(id= 5, name= "lacoste", description= "Polo - Blue", price= 300.00, image= "https://example.com/lacoste.jpg", stock= 22)
-products_db[6] = Product(id= 6, name= "jeans", description= "Baggy - Seablue", price= 250.00, image= "https://example.com/jeans.jpg", stock=1)
+class ErrorDetail(AppModel):
+    """Model for an error response body."""
+    detail: str
+
+@app.on_event("startup")
+async def startup():
+    await migrate_legacy_products()
+    await create_indexes()
+    await seed_products()
+    await refresh_prices()
+    pricing.warm_up()
+
+
+# Only one coroutine per worker reloads the price table at a time
+prices_lock = asyncio.Lock()
+
+
+async def refresh_prices():
+    async with prices_lock:
+        # Checkouts that queued behind a reload find the table fresh and skip their own
+        if not pricing.prices_stale():
+            return
+        pricing.load_prices(await ecommerce_collection.find({}, {"price": 1}).to_list(length=None))
+
+
+async def user_exists(user_id: int) -> bool:
+    return await users_collection.count_documents({"_id": user_id}, limit=1) > 0
 
 
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Whether an If-None-Match header value covers the given ETag."""
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
+
+def not_found(detail: str) -> Response:
+    """Build a 404 response directly; misses are common enough that raising HTTPException adds up."""
+    return ORJSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"detail": detail})
+
+
+def cart_items(cart: Dict[int, int]) -> List[ProductInOrder]:
+    """Turn a stored cart into the list shape the API returns."""
+    return [ProductInOrder(product_id=product_id, quantity=quantity) for product_id, quantity in cart.items()]
+
 
 # --- API Endpoints ---
 
@@ -109,22 +154,48 @@ def read_root():
 @app.get(
     "/products/",
     tags=["Products"],
-    response_model=List[Product],
+    responses={200: {"model": List[Product]}},
     summary="Get all products"
 )
-def get_products():
-    return list(products_db.values())
+async def get_products(request: Request):
+    # Serve the already-serialized catalog; products are validated once, when it is built
+    cached = local_get(PRODUCTS_ALL_KEY)
+    if cached is None:
+        products_blob = await cache_get(PRODUCTS_ALL_KEY)
+        if products_blob is None:
+            docs = await ecommerce_collection.find({}, PRODUCT_PROJECTION).to_list(length=None)
+            products_blob = orjson.dumps([Product(**doc).model_dump(mode="json") for doc in docs])
+            await cache_set(PRODUCTS_ALL_KEY, products_blob)
+        etag = f'"{hashlib.blake2b(products_blob, digest_size=16).hexdigest()}"'
+        cached = (products_blob, etag)
+        local_set(PRODUCTS_ALL_KEY, cached)
+
+    products_blob, etag = cached
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={PRODUCTS_TTL}"}
+    # Clients that already hold this version of the catalog get no body at all
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=products_blob, media_type="application/json", headers=headers)
 
 @app.get(
     "/products/{product_id}",
     tags=["Products"],
-    response_model=Product,
+    responses={200: {"model": Product}, 404: {"model": ErrorDetail}},
     summary="Get a product by ID"
 )
-def get_product(product_id: int):
-    if product_id not in products_db:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
-    return products_db[product_id]
+async def get_product(product_id: int):
+    # Check the in-process cache, then Redis, then fall back to Mongo
+    product_blob = local_get(product_id)
+    if product_blob is None:
+        product_blob = await cache_get(product_key(product_id))
+        if product_blob is None:
+            doc = await ecommerce_collection.find_one({"_id": product_id}, PRODUCT_PROJECTION)
+            if not doc:
+                return not_found("Product not found")
+            product_blob = Product(**doc).model_dump_json().encode()
+            await cache_set(product_key(product_id), product_blob)
+        local_set(product_id, product_blob)
+    return Response(content=product_blob, media_type="application/json")
 
 
 
@@ -136,81 +207,91 @@ def get_product(product_id: int):
     status_code=status.HTTP_201_CREATED,
     summary="Register a new user"
 )
-def register_user(user: UserCreate):
-    global next_user_id
-    
-    # Check if username or email already exists
-    for existing_user in users_db.values():
+async def register_user(user: UserCreate):
+    # Reject known duplicates before spending a user ID and a password hash on them
+    existing_user = await users_collection.find_one(
+        {"$or": [{"username": user.username}, {"email": user.email}]},
+        {"username": 1}
+    )
+    if existing_user:
         if existing_user["username"] == user.username:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Username already registered")
-        if existing_user["email"] == user.email:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
-            
-    # Create the new user and add to the database
-    new_user = User(id=next_user_id, username=user.username, email=user.email)
-    users_db[next_user_id] = {
-        "id": next_user_id,
-        "username": user.username,
-        "email": user.email,
-        "password": user.password  # Storing password in plain text for this simple example
-    }
-    next_user_id += 1
-    return new_user
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
+
+    # Hashing is CPU-bound, so keep it off the event loop
+    pwhash = await run_in_threadpool(hash_password, user.password)
+    user_id = await next_sequence("users")
+
+    # The unique indexes still catch a duplicate registered concurrently
+    try:
+        await users_collection.insert_one({
+            "_id": user_id,
+            "username": user.username,
+            "email": user.email,
+            "pwhash": pwhash
+        })
+    except DuplicateKeyError as e:
+        if "username" in (e.details or {}).get("keyPattern", {}):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Username already registered")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
+
+    return User(id=user_id, username=user.username, email=user.email)
 
 @app.post(
     "/login",
     tags=["Users"],
     summary="Log in a user"
 )
-def login_user(user: UserLogin):
-    for existing_user in users_db.values():
-        if existing_user["email"] == user.email and existing_user["password"] == user.password:
-            return {"message": "Login successful"}
-    
+async def login_user(user: UserLogin):
+    existing_user = await users_collection.find_one({"email": user.email}, {"pwhash": 1})
+    if existing_user and await run_in_threadpool(verify_password, user.password, existing_user["pwhash"]):
+        return {"message": "Login successful"}
+
     raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
 
 @app.post(
     "/cart/",
     tags=["Cart"],
+    responses={404: {"model": ErrorDetail}},
     summary="Add an item to a user's cart"
 )
-def add_to_cart(add_request: AddToCartRequest):
-    if add_request.user_id not in users_db:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-        
-    product = products_db.get(add_request.product_id)
-    if not product:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, 
-            detail="Product not found"
-        )
-
-    # Check for sufficient stock before adding to cart
-    if add_request.quantity > product.stock:
+async def add_to_cart(add_request: AddToCartRequest):
+    if not await user_exists(add_request.user_id):
+        return not_found("User not found")
+
+    # Check and reserve the stock in a single atomic round trip
+    product = await ecommerce_collection.find_one_and_update(
+        {"_id": add_request.product_id, "stock": {"$gte": add_request.quantity}},
+        {"$inc": {"stock": -add_request.quantity}},
+        projection={"_id": 1}
+    )
+    if product is None:
+        # Only the failure path needs another lookup to tell the two errors apart
+        product = await ecommerce_collection.find_one({"_id": add_request.product_id}, {"name": 1})
+        if not product:
+            return not_found("Product not found")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Not enough stock for product '{product.name}'."
+            detail=f"Not enough stock for product '{product['name']}'."
         )
-
-    if add_request.user_id not in carts_db:
-        carts_db[add_request.user_id] = []
-
-    cart_items = carts_db[add_request.user_id]
-    
-    # Check if the product is already in the cart
-    found = False
-    for item in cart_items:
-        if item.product_id == add_request.product_id:
-            item.quantity += add_request.quantity
-            found = True
-            break
-    
-    if not found:
-        new_item = ProductInOrder(
-            product_id=add_request.product_id, 
-            quantity=add_request.quantity
+    await invalidate_products(add_request.product_id)
+
+    try:
+        await carts.add_item(add_request.user_id, add_request.product_id, add_request.quantity)
+    except carts.CartWriteError as e:
+        # Only hand the reserved stock back when the item certainly isn't in the cart.
+        # If Redis can't even tell us (applied is None) the stock stays reserved:
+        # that can strand stock during an outage, but never oversells it.
+        if e.applied is False:
+            await ecommerce_collection.update_one(
+                {"_id": add_request.product_id},
+                {"$inc": {"stock": add_request.quantity}}
+            )
+            await invalidate_products(add_request.product_id)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Cart storage is unavailable, please try again."
         )
-        cart_items.append(new_item)
 
     return {"message": f"Added {add_request.quantity} of product {add_request.product_id} to cart for user {add_request.user_id}"}
 
@@ -219,45 +300,66 @@ def add_to_cart(add_request: AddToCartRequest):
     "/cart/{user_id}",
     tags=["Cart"],
     response_model=List[ProductInOrder],
+    responses={404: {"model": ErrorDetail}},
     summary="Get a user's cart"
 )
-def get_cart(user_id: int):
-    cart = carts_db.get(user_id)
+async def get_cart(user_id: int):
+    cart = await carts.get_cart(user_id)
     if not cart:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Cart not found for this user")
-    return cart
+        return not_found("Cart not found for this user")
+    return cart_items(cart)
 
 @app.post(
     "/checkout/{user_id}",
     tags=["Orders"],
     response_model=CheckoutSummary,
+    responses={404: {"model": ErrorDetail}},
     summary="Calculate checkout summary for a user's cart"
 )
-def checkout(user_id: int):
-    if user_id not in users_db:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+async def checkout(user_id: int):
+    if not await user_exists(user_id):
+        return not_found("User not found")
 
-    cart_items = carts_db.get(user_id)
-    if not cart_items:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, 
-            detail="Cart not found for this user."
-        )
-
-    total_price = 0
-    # Calculate the total price based on items in the cart
-    for item in cart_items:
-        product = products_db.get(item.product_id)
-        if not product:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Product with ID {item.product_id} in cart not found."
-            )
-        
-        # In a real app, you would also check for stock availability here before finalizing.
-        total_price += product.price * item.quantity
+    cart = await carts.get_cart(user_id)
+    if not cart:
+        return not_found("Cart not found for this user.")
+
+    # Prices come from an in-process table that is reloaded once it is PRICES_TTL old
+    if pricing.prices_stale():
+        await refresh_prices()
+    missing_ids = pricing.missing_products(cart)
+    if missing_ids:
+        # Products created since the last load: fetch just those and add them to the table
+        found = await ecommerce_collection.find({"_id": {"$in": missing_ids}}, {"price": 1}).to_list(length=None)
+        pricing.add_prices(found)
+        missing_ids = pricing.missing_products(cart)
+        if missing_ids:
+            return not_found(f"Product with ID {missing_ids[0]} in cart not found.")
+
+    # In a real app, you would also check for stock availability here before finalizing.
+    total_price = pricing.cart_total(cart)
 
     return CheckoutSummary(
-        cart_items=cart_items, 
+        cart_items=cart_items(cart), 
         total_price=total_price
     )
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # Without Redis, carts live in each worker's memory, so only one worker is safe
+    workers = int(os.getenv("WEB_CONCURRENCY", (os.cpu_count() or 1) if REDIS_URL else 1))
+    if workers > 1 and not REDIS_URL:
+        sys.exit("Running more than one worker requires REDIS_URL, or carts won't be shared between them.")
+
+    # uvloop has no Windows build, so fall back to the default loop there
+    uvicorn.run(
+        "main:app",
+        host=os.getenv("HOST", "127.0.0.1"),
+        port=int(os.getenv("PORT", "8000")),
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        workers=workers,
+        log_level="warning"
+    )
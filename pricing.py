@@ -0,0 +1,81 @@
+import time
+from types import MappingProxyType
+import numpy as np
+import checkout_core
+
+try:
+    from numba import njit
+except ImportError:  # No LLVM on this platform; cart_total uses NumPy instead
+    njit = None
+
+# Product prices packed into a contiguous array; product_index maps product ID -> position
+product_price_array = np.empty(0, dtype=np.float64)
+
+# Read-only views, so they can be handed out and checked without copying
+product_index = MappingProxyType({})
+product_prices = MappingProxyType({})
+
+# Below this many items, building NumPy arrays costs more than a plain loop
+SMALL_CART = 64
+
+# How long a full load of the table is trusted before checkout reloads it, in seconds
+PRICES_TTL = 60
+prices_loaded_at = float("-inf")
+
+
+def _build(prices_by_id):
+    global product_price_array, product_index, product_prices
+    product_price_array = np.fromiter(prices_by_id.values(), dtype=np.float64, count=len(prices_by_id))
+    product_index = MappingProxyType({product_id: i for i, product_id in enumerate(prices_by_id)})
+    product_prices = MappingProxyType(prices_by_id)
+
+
+def load_prices(products):
+    """Rebuild the whole price table from product documents with "_id" and "price"."""
+    global prices_loaded_at
+    _build({product["_id"]: product["price"] for product in products})
+    prices_loaded_at = time.monotonic()
+
+
+def add_prices(products):
+    """Merge product documents into the table, e.g. products created after the last load."""
+    prices_by_id = dict(product_prices)
+    prices_by_id.update((product["_id"], product["price"]) for product in products)
+    _build(prices_by_id)
+
+
+def prices_stale():
+    return time.monotonic() - prices_loaded_at > PRICES_TTL
+
+
+def missing_products(cart):
+    """Return the product IDs in the cart that have no price in the table."""
+    return checkout_core.missing_products(product_index, cart)
+
+
+if njit is not None:
+    # cache=True writes the compiled kernel to __pycache__ so workers skip the cold compile
+    @njit(cache=True)
+    def _total(prices, idxs, qtys):
+        s = 0.0
+        for i in range(idxs.size):
+            s += prices[idxs[i]] * qtys[i]
+        return s
+else:
+    def _total(prices, idxs, qtys):
+        return np.dot(prices.take(idxs), qtys)
+
+
+def warm_up():
+    """Compile (or load the cached) kernel now rather than on the first large checkout."""
+    _total(np.zeros(1, dtype=np.float64), np.zeros(1, dtype=np.intp), np.zeros(1, dtype=np.float64))
+
+
+def cart_total(cart):
+    """Total price of a product_id -> quantity cart."""
+    if len(cart) < SMALL_CART:
+        return checkout_core.compute_total(product_prices, cart)
+    index = product_index
+    idxs = np.fromiter((index[product_id] for product_id in cart), dtype=np.intp, count=len(cart))
+    qtys = np.fromiter(cart.values(), dtype=np.float64, count=len(cart))
+    return float(_total(product_price_array, idxs, qtys))
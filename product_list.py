@@ -1,8 +1,8 @@
 products = [
-{"id":1, "name":"Smartphone", "description": "A great phone with a fantastic camera.", "price":699.99, "image": "https://example.com/smartphone.jpg"},
-{"id":2, "name":"Laptop", "description": "Powerful laptop for work and gaming.", "price":1200.00, "image": "https://example.com/laptop.jpg"},
-{"id":3, "name":"Wireless Headphones", "description": "Noise-cancelling headphones with long battery life.", "price":199.50, "image":"https://example.com/headphones.jpg"},
-{"id":4, "name": "bag", "description": "Louis Vuitton - black", "price": 500.00, "image": "https://example.com/bag.jpg"},
-{"id":5, "name": "lacoste", "description": "Polo - Blue", "price": 300.00, "image": "https://example.com/lacoste.jpg"},
-{"id":6, "name": "jeans", "description": "Baggy - Seablue", "price": 250.00, "image": "https://example.com/jeans.jpg"}
+{"id":1, "name":"Smartphone", "description": "A great phone with a fantastic camera.", "price":699.99, "image": "https://example.com/smartphone.jpg", "stock":15},
+{"id":2, "name":"Laptop", "description": "Powerful laptop for work and gaming.", "price":1200.00, "image": "https://example.com/laptop.jpg", "stock":8},
+{"id":3, "name":"Wireless Headphones", "description": "Noise-cancelling headphones with long battery life.", "price":199.50, "image":"https://example.com/headphones.jpg", "stock":30},
+{"id":4, "name": "bag", "description": "Louis Vuitton - black", "price": 500.00, "image": "https://example.com/bag.jpg", "stock":5},
+{"id":5, "name": "lacoste", "description": "Polo - Blue", "price": 300.00, "image": "https://example.com/lacoste.jpg", "stock":22},
+{"id":6, "name": "jeans", "description": "Baggy - Seablue", "price": 250.00, "image": "https://example.com/jeans.jpg", "stock":1}
 ]
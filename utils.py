@@ -1,4 +1,20 @@
+import os
+import bcrypt
+
+# bcrypt cost factor; each step doubles the time. 10 is the OWASP minimum and
+# takes roughly 80 ms per hash or verify on current server CPUs.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "10"))
+
+
 def replace_mongo_id(doc):
     doc["_id"] = str(doc["_id"])
     del doc["_id"]
-    return doc
\ No newline at end of file
+    return doc
+
+
+def hash_password(password):
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode()
+
+
+def verify_password(password, pwhash):
+    return bcrypt.checkpw(password.encode(), pwhash.encode())